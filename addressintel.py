@@ -0,0 +1,336 @@
+"""
+Headless entry point for AddressIntel AI (no Streamlit required).
+
+    python addressintel.py run input.xlsx -o out.parquet --mode free --concurrency 8
+    python addressintel.py run input.csv -o out.xlsx --mode agentic   # needs OPENAI_API_KEY
+    python addressintel.py serve --host 127.0.0.1 --port 8000
+
+Sharded mode for very large files (see distributed.py); use redis:// across
+hosts, or sqlite:///queue.db for several worker processes on one machine:
+
+    python addressintel.py submit big.xlsx --queue redis://queue-host:6379/0 --unit-size 200
+    python addressintel.py work JOB_ID --queue redis://queue-host:6379/0     # on each host
+    python addressintel.py status JOB_ID --queue redis://queue-host:6379/0
+    python addressintel.py merge JOB_ID --queue redis://queue-host:6379/0 -o out.parquet
+
+Only the Free Mode stack (requests + BeautifulSoup) is loaded at startup;
+Playwright/OpenAI are imported the first time an agentic extraction runs.
+"""
+import argparse
+import json
+import os
+import sys
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import metrics
+from extraction import (
+    DESIRED_COLS, MODES, normalize_url, extract_company, format_rows,
+    results_frame, read_input, write_output, check_output_writable, run_batch
+)
+from host_health import HostHealthCache, CircuitBreaker
+
+# Upper bound on per-request worker threads for POST /batch
+MAX_API_CONCURRENCY = 16
+# Span samples kept per stage by the server-lifetime collector (bounds memory)
+SERVER_METRICS_SAMPLES = 2048
+
+
+def _check_mode(mode, api_key):
+    """Return an error message if the mode can't run, else None"""
+    if mode not in MODES:
+        return f"Unknown mode '{mode}' (expected one of {MODES})"
+    if mode == "agentic":
+        from agent_logic import agentic_available
+        if not agentic_available():
+            return "Agentic mode needs playwright, openai and duckduckgo-search installed"
+        if not api_key:
+            return "Agentic mode needs an OpenAI API key (--api-key or OPENAI_API_KEY)"
+    return None
+
+
+# ---------------- CLI: run ----------------
+def cmd_run(args):
+    api_key = args.api_key or os.environ.get("OPENAI_API_KEY", "")
+    error = _check_mode(args.mode, api_key)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    try:
+        check_output_writable(args.output)
+        input_data = read_input(args.input)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    def progress(done, total, name, url):
+        if not args.quiet:
+            print(f"[{done}/{total}] {name} ({url})", file=sys.stderr)
+
+    run_metrics = metrics.RunMetrics()
+    with metrics.collect(run_metrics):
+        rows = run_batch(input_data, mode=args.mode, api_key=api_key, proxy_url=args.proxy,
+                         concurrency=args.concurrency, on_progress=progress)
+
+    write_output(results_frame(rows), args.output)
+    summary = run_metrics.to_dict()
+    print(f"Wrote {len(rows)} rows for {summary['counters'].get('companies', 0)} companies "
+          f"to {args.output} in {summary['wall_s']:.1f}s", file=sys.stderr)
+
+    if args.metrics_json:
+        with open(args.metrics_json, "w") as f:
+            f.write(run_metrics.to_json())
+    return 0
+
+
+# ---------------- HTTP API: serve ----------------
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health   -> {"status": "ok", ...}
+    GET  /metrics  -> Prometheus text for the server lifetime
+    POST /extract  {"url", "name"?, "mode"?, "api_key"?, "proxy_url"?} -> {"rows": [...]}
+    POST /batch    {"companies": [{"COMPANY NAME", "OFFICIAL WEBSITE"}], "mode"?, "concurrency"?}
+                   (concurrency is capped at MAX_API_CONCURRENCY)
+    """
+    host_cache = None
+    server_metrics = None
+    default_api_key = ""
+
+    def handle(self):
+        # Each connection runs on its own thread; report into the server collector
+        with metrics.collect(self.server_metrics):
+            super().handle()
+
+    def _send(self, status, payload, content_type="application/json"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/health":
+            from agent_logic import agentic_available
+            self._send(200, {"status": "ok", "modes": MODES, "agentic_available": agentic_available()})
+        elif self.path == "/metrics":
+            self._send(200, self.server_metrics.to_prometheus().encode("utf-8"),
+                       "text/plain; version=0.0.4")
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._send(400, {"error": "Invalid JSON body"})
+            return
+        if not isinstance(body, dict):
+            self._send(400, {"error": "JSON body must be an object"})
+            return
+
+        mode = body.get("mode", "free")
+        api_key = body.get("api_key") or self.default_api_key
+        error = _check_mode(mode, api_key)
+        if error:
+            self._send(400, {"error": error})
+            return
+
+        if self.path == "/extract":
+            url = normalize_url(str(body.get("url") or ""))
+            if not url:
+                self._send(400, {"error": "url is required"})
+                return
+        elif self.path == "/batch":
+            companies = body.get("companies", [])
+            if not isinstance(companies, list) or not all(isinstance(c, dict) for c in companies):
+                self._send(400, {"error": "companies must be a list of objects"})
+                return
+            try:
+                concurrency = int(body.get("concurrency", 4))
+            except (TypeError, ValueError):
+                self._send(400, {"error": "concurrency must be an integer"})
+                return
+            concurrency = max(1, min(concurrency, MAX_API_CONCURRENCY))
+        else:
+            self._send(404, {"error": "Not found"})
+            return
+
+        # Fresh breaker per request; the persistent dead-host cache is shared
+        breaker = CircuitBreaker(self.host_cache)
+        try:
+            if self.path == "/extract":
+                with metrics.span("company"):
+                    metrics.incr("companies")
+                    raw_data = extract_company(url, mode, api_key, body.get("proxy_url"), breaker)
+                rows = format_rows(raw_data, body.get("name", ""), url)
+            else:
+                rows = run_batch(companies, mode=mode, api_key=api_key,
+                                 proxy_url=body.get("proxy_url"),
+                                 concurrency=concurrency, breaker=breaker)
+        except Exception as e:
+            metrics.incr("errors")
+            self._send(500, {"error": f"Extraction failed: {e}"})
+            return
+
+        self._send(200, {"rows": [{c: row.get(c, "") for c in DESIRED_COLS} for row in rows]})
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+
+def cmd_serve(args):
+    ApiHandler.host_cache = HostHealthCache()
+    ApiHandler.server_metrics = metrics.RunMetrics(max_samples=SERVER_METRICS_SAMPLES)
+    ApiHandler.default_api_key = os.environ.get("OPENAI_API_KEY", "")
+
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    server.daemon_threads = True
+    print(f"AddressIntel API listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+# ---------------- SHARDED: submit / work / status / merge ----------------
+def cmd_submit(args):
+    import distributed
+    error = None if args.mode == "free" else _check_mode(args.mode, "set on workers")
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+    try:
+        input_data = read_input(args.input)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    queue = distributed.open_queue(args.queue)
+    job_id = distributed.submit_job(
+        queue, input_data, mode=args.mode, proxy_url=args.proxy, unit_size=args.unit_size,
+        lease_seconds=args.lease_seconds, max_attempts=args.max_attempts,
+        concurrency=args.concurrency, job_id=args.job_id
+    )
+    print(f"Submitted {len(input_data)} companies as job {job_id}", file=sys.stderr)
+    print(job_id)
+    return 0
+
+
+def cmd_work(args):
+    import distributed
+    queue = distributed.open_queue(args.queue)
+    config = queue.job_config(args.job_id)
+    api_key = args.api_key or os.environ.get("OPENAI_API_KEY", "")
+    error = _check_mode(config["mode"], api_key)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    log = (lambda msg: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+    run_metrics = metrics.RunMetrics()
+    with metrics.collect(run_metrics):
+        completed = distributed.run_worker(queue, args.job_id, api_key=api_key,
+                                           worker_id=args.worker_id, wait=args.wait, log=log)
+    print(f"Worker finished: {completed} unit(s) completed", file=sys.stderr)
+    if args.metrics_json:
+        with open(args.metrics_json, "w") as f:
+            f.write(run_metrics.to_json())
+    return 0
+
+
+def cmd_status(args):
+    import distributed
+    queue = distributed.open_queue(args.queue)
+    print(json.dumps(distributed.job_status(queue, args.job_id)))
+    return 0
+
+
+def cmd_merge(args):
+    import distributed
+    queue = distributed.open_queue(args.queue)
+    try:
+        check_output_writable(args.output)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    try:
+        rows = distributed.merge_to_file(queue, args.job_id, args.output, args.allow_partial)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Wrote {rows} rows to {args.output}", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="addressintel", description="AddressIntel AI headless runner")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Extract addresses for a bulk file")
+    run.add_argument("input", help="Input .xlsx/.csv/.parquet with COMPANY NAME, OFFICIAL WEBSITE")
+    run.add_argument("-o", "--output", required=True, help="Output .parquet/.xlsx/.csv/.json")
+    run.add_argument("--mode", choices=MODES, default="free")
+    run.add_argument("--api-key", default="", help="OpenAI API key (default: $OPENAI_API_KEY)")
+    run.add_argument("--proxy", default=None, help="HTTP proxy URL for Agentic Mode")
+    run.add_argument("--concurrency", type=int, default=4, help="Companies processed in parallel")
+    run.add_argument("--metrics-json", default=None, help="Write run metrics JSON to this file")
+    run.add_argument("-q", "--quiet", action="store_true", help="Don't print per-company progress")
+    run.set_defaults(func=cmd_run)
+
+    serve = sub.add_parser("serve", help="Run the local HTTP API")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.set_defaults(func=cmd_serve)
+
+    submit = sub.add_parser("submit", help="Split a bulk file into leased work units")
+    submit.add_argument("input", help="Input .xlsx/.csv/.parquet with COMPANY NAME, OFFICIAL WEBSITE")
+    submit.add_argument("--queue", required=True, help="redis://host:port/db (multi-host) or sqlite:///path.db (one host)")
+    submit.add_argument("--mode", choices=MODES, default="free")
+    submit.add_argument("--proxy", default=None, help="HTTP proxy URL for Agentic Mode")
+    submit.add_argument("--unit-size", type=int, default=100, help="Companies per work unit")
+    submit.add_argument("--lease-seconds", type=int, default=300, help="Lease length before reassignment")
+    submit.add_argument("--max-attempts", type=int, default=3, help="Attempts per unit before it fails")
+    submit.add_argument("--concurrency", type=int, default=4, help="Companies in parallel per worker")
+    submit.add_argument("--job-id", default=None, help="Job id (default: random)")
+    submit.set_defaults(func=cmd_submit)
+
+    work = sub.add_parser("work", help="Process units of a job until none are left")
+    work.add_argument("job_id")
+    work.add_argument("--queue", required=True)
+    work.add_argument("--api-key", default="", help="OpenAI API key (default: $OPENAI_API_KEY)")
+    work.add_argument("--worker-id", default=None, help="Default: hostname:pid")
+    work.add_argument("--wait", action="store_true",
+                      help="Keep polling until the job finishes (picks up expired leases)")
+    work.add_argument("--metrics-json", default=None, help="Write worker metrics JSON to this file")
+    work.add_argument("-q", "--quiet", action="store_true")
+    work.set_defaults(func=cmd_work)
+
+    status = sub.add_parser("status", help="Show unit counts for a job")
+    status.add_argument("job_id")
+    status.add_argument("--queue", required=True)
+    status.set_defaults(func=cmd_status)
+
+    merge = sub.add_parser("merge", help="Merge a job's results into one output file")
+    merge.add_argument("job_id")
+    merge.add_argument("--queue", required=True)
+    merge.add_argument("-o", "--output", required=True, help="Output .parquet/.xlsx/.csv/.json")
+    merge.add_argument("--allow-partial", action="store_true", help="Merge even if units failed")
+    merge.set_defaults(func=cmd_merge)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
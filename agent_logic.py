@@ -1,25 +1,70 @@
 import re
 import time
 import json
+import importlib.util
 from urllib.parse import urljoin, urlparse
 
-from playwright.sync_api import sync_playwright
-from openai import OpenAI
-from duckduckgo_search import DDGS
+import metrics
+
+# Playwright, OpenAI and duckduckgo_search are imported lazily so that
+# Free Mode runs (CLI, API, Streamlit) never pay for loading them.
+AGENTIC_DEPENDENCIES = ["playwright", "openai", "duckduckgo_search"]
+
+def agentic_available():
+    """True if the heavy Agentic Mode dependencies are installed"""
+    return all(importlib.util.find_spec(name) for name in AGENTIC_DEPENDENCIES)
+
+def _ddgs():
+    """DuckDuckGo search client, imported on first use"""
+    from duckduckgo_search import DDGS
+    return DDGS()
+
+def _classify_nav_error(e):
+    """Map a Playwright navigation error to a circuit-breaker reason (None = soft failure)"""
+    msg = str(e)
+    if "ERR_NAME_NOT_RESOLVED" in msg or "ERR_NAME_RESOLUTION_FAILED" in msg:
+        return "dns"
+    if "ERR_CONNECTION" in msg or "ERR_ADDRESS_UNREACHABLE" in msg:
+        return "connect"
+    if "networkidle" in msg:
+        # Chatty live sites never go network-idle; that is not a dead host
+        return None
+    if "Timeout" in msg or "ERR_TIMED_OUT" in msg:
+        return "timeout"
+    return None
 
 class AgenticExtractor:
-    def __init__(self, openai_api_key=None, proxy_url=None):
+    def __init__(self, openai_api_key=None, proxy_url=None, breaker=None):
         self.openai_api_key = openai_api_key
         self.proxy_url = proxy_url
+        self.breaker = breaker
         self.client = None
         if self.openai_api_key:
+            from openai import OpenAI
             self.client = OpenAI(api_key=self.openai_api_key)
 
     # ... (rest of methods)
 
-    def process_url(self, url):
+    def _record_nav_error(self, url, e, breaker):
+        reason = _classify_nav_error(e)
+        if breaker and reason:
+            breaker.record_failure(url, reason)
+
+    def process_url(self, url, breaker=None):
+        # A per-call breaker lets one cached extractor serve many runs
+        with metrics.span("process_url"):
+            return self._process_url(url, breaker or self.breaker)
+
+    def _process_url(self, url, breaker):
         extracted_data = []
         
+        if breaker and breaker.is_open(url):
+            print(f"Skipping {url}: host circuit open")
+            metrics.incr("host_cache_hits")
+            return extracted_data
+        
+        from playwright.sync_api import sync_playwright
+        
         with sync_playwright() as p:
             launch_args = {"headless": True}
             if self.proxy_url:
@@ -32,7 +77,9 @@ class AgenticExtractor:
             
             try:
                 print(f"Navigating to {url}")
-                page.goto(url, timeout=30000, wait_until="networkidle")
+                with metrics.span("navigate"):
+                    page.goto(url, timeout=30000, wait_until="networkidle")
+                metrics.incr("pages")
                 
                 # 1. Scan Homepage
                 content = page.inner_text("body")
@@ -59,12 +106,17 @@ class AgenticExtractor:
                 for target in targets:
                     if target in processed_targets: continue
                     processed_targets.add(target)
+                    if breaker and breaker.is_open(target):
+                        print(f"Skipping page: {target} (host circuit open)")
+                        continue
                     
                     print(f"Checking page: {target}")
                     try:
                         if target != url:
-                            page.goto(target, timeout=20000)
-                            time.sleep(2) # Wait for JS renders
+                            with metrics.span("navigate"):
+                                page.goto(target, timeout=20000)
+                                time.sleep(2) # Wait for JS renders
+                            metrics.incr("pages")
                         
                         # --- DEEP INTERACTION UPGRADE ---
                         # 1. Handle Dropdowns/Selects for "Location"
@@ -95,24 +147,35 @@ class AgenticExtractor:
                             except:
                                 pass
                                 
+                        metrics.incr("bytes", len(visible_text.encode("utf-8")))
+                        
                         # LLM Extraction
-                        addresses = self._get_llm_response(visible_text)
+                        # Token count is estimated (~4 chars/token) from the prompt text
+                        metrics.incr("llm_calls")
+                        metrics.incr("llm_tokens_est", len(visible_text) // 4)
+                        with metrics.span("llm"):
+                            addresses = self._get_llm_response(visible_text)
                         
                         if addresses:
                             for addr in addresses:
                                 # Validation: Must have at least street or city
                                 if addr.get("street1") or addr.get("city"):
                                     # Search refinement
-                                    final_addr = self._search_missing_info(addr)
+                                    with metrics.span("search"):
+                                        final_addr = self._search_missing_info(addr)
                                     final_addr["source_url"] = target
                                     extracted_data.append(final_addr)
                                     
                     except Exception as e:
                         print(f"Error visiting {target}: {e}")
+                        metrics.incr("errors")
+                        self._record_nav_error(target, e, breaker)
                         continue
                         
             except Exception as e:
                 print(f"Failed to process {url}: {e}")
+                metrics.incr("errors")
+                self._record_nav_error(url, e, breaker)
             finally:
                 browser.close()
                 
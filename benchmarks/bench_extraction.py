@@ -0,0 +1,207 @@
+"""
+Offline extraction benchmark.
+
+Serves recorded company sites from a local fixture farm, stubs the LLM and
+search calls, and reports companies/min, per-stage latency and peak memory
+for Free Mode (process_url_free) and Agentic Mode (AgenticExtractor.process_url).
+
+    python -m benchmarks.bench_extraction --companies 40 --concurrency 1,4,8
+    python -m benchmarks.bench_extraction --mode agentic --json bench_output.txt
+    python -m benchmarks.bench_extraction --baseline last_run.json --max-regression 0.15
+"""
+import argparse
+import contextvars
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import metrics
+from extraction import extract_physical_addresses_simple, process_url_free
+from host_health import HostHealthCache, CircuitBreaker, preflight
+from benchmarks.fixture_farm import FixtureFarm
+
+
+def _stub_extractor_class(llm_latency, search_latency):
+    """AgenticExtractor with the LLM and web search replaced by local stubs"""
+    from agent_logic import AgenticExtractor
+
+    class StubExtractor(AgenticExtractor):
+        def _get_llm_response(self, text):
+            time.sleep(llm_latency)
+            return [{"street1": line[:100], "street2": "", "city": "", "state": "",
+                     "zip": "", "country": ""}
+                    for line in extract_physical_addresses_simple(text)]
+
+        def _search_missing_info(self, addr):
+            time.sleep(search_latency)
+            return dict(addr)
+
+    return StubExtractor
+
+
+def _agentic_unavailable():
+    """Why the agentic benchmark can't run here (None if it can)"""
+    from agent_logic import AGENTIC_DEPENDENCIES, agentic_available
+    if not agentic_available():
+        return f"{', '.join(AGENTIC_DEPENDENCIES)} must be installed"
+    from playwright.sync_api import sync_playwright
+    try:
+        with sync_playwright() as p:
+            chromium = p.chromium.executable_path
+    except Exception as e:
+        return f"Playwright failed to start: {e}"
+    if not chromium or not os.path.exists(chromium):
+        return f"Chromium not found at {chromium} (run `playwright install chromium`)"
+    return None
+
+
+def _peak_rss_mb():
+    """
+    Peak RSS of this process and of reaped children (Chromium), in MB.
+    ru_maxrss covers the whole process lifetime, so each configuration runs
+    in a fresh process (see run_isolated).
+    """
+    factor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / factor
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / factor
+    return round(own, 1), round(children, 1)
+
+
+def run_once(mode, urls, concurrency, args):
+    """Extract every URL at the given concurrency; return a result dict"""
+    cache = HostHealthCache(os.path.join(tempfile.mkdtemp(), "host_health.db"))
+    breaker = CircuitBreaker(cache)
+    run_metrics = metrics.RunMetrics()
+
+    if mode == "free":
+        extract = lambda url: process_url_free(url, breaker)
+    else:
+        StubExtractor = _stub_extractor_class(args.llm_latency, args.search_latency)
+        extract = lambda url: StubExtractor(breaker=breaker).process_url(url)
+
+    def work(url):
+        with metrics.span("company"):
+            rows = extract(url)
+        run_metrics.incr("companies")
+        run_metrics.incr("rows", len(rows))
+        return rows
+
+    start = time.perf_counter()
+    with metrics.collect(run_metrics):
+        with metrics.span("preflight"):
+            preflight(urls, cache=cache, breaker=breaker)
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, work, url) for url in urls]
+            for future in futures:
+                future.result()
+    wall = time.perf_counter() - start
+
+    own_mb, children_mb = _peak_rss_mb()
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "companies": len(urls),
+        "wall_s": round(wall, 3),
+        "companies_per_min": round(len(urls) / wall * 60, 1) if wall else 0.0,
+        "peak_rss_mb": own_mb,
+        "peak_child_rss_mb": children_mb,
+        "stages": run_metrics.summary(),
+        "counters": dict(run_metrics.counters),
+    }
+
+
+def run_isolated(mode, urls, concurrency, args):
+    """run_once in a fresh spawned process so peak-memory figures are per configuration"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_once, mode, urls, concurrency, args).result()
+
+
+def print_result(r):
+    print(f"\n== {r['mode']} | concurrency={r['concurrency']} | {r['companies']} companies ==")
+    print(f"wall {r['wall_s']}s  |  {r['companies_per_min']} companies/min  |  "
+          f"peak RSS {r['peak_rss_mb']} MB (children {r['peak_child_rss_mb']} MB)")
+    print(f"{'stage':<18}{'count':>7}{'p50 s':>10}{'p95 s':>10}{'max s':>10}{'total s':>10}")
+    for stage, s in r["stages"].items():
+        print(f"{stage:<18}{s['count']:>7}{s['p50_s']:>10}{s['p95_s']:>10}{s['max_s']:>10}{s['total_s']:>10}")
+    print("counters: " + ", ".join(f"{k}={v}" for k, v in sorted(r["counters"].items())))
+
+
+def check_regressions(results, baseline_path, max_regression):
+    """Compare companies/min against a previous --json output; return failures"""
+    with open(baseline_path) as f:
+        baseline = {(b["mode"], b["concurrency"]): b for b in json.load(f)["results"]}
+    failures = []
+    for r in results:
+        b = baseline.get((r["mode"], r["concurrency"]))
+        if not b or not b["companies_per_min"]:
+            continue
+        drop = 1 - r["companies_per_min"] / b["companies_per_min"]
+        if drop > max_regression:
+            failures.append(f"{r['mode']} @ {r['concurrency']}: {b['companies_per_min']} -> "
+                            f"{r['companies_per_min']} companies/min ({drop:.0%} slower)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline AddressIntel extraction benchmark")
+    parser.add_argument("--mode", choices=["free", "agentic", "both"], default="free")
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--concurrency", default="1,4",
+                        help="Comma-separated worker counts to run, e.g. 1,4,8")
+    parser.add_argument("--mix", default="static=6,js=2,slow=1,dead=1",
+                        help="Site kind weights: static, js, slow, dead")
+    parser.add_argument("--slow-delay", type=float, default=2.0,
+                        help="Seconds a slow host waits before each response")
+    parser.add_argument("--llm-latency", type=float, default=0.8,
+                        help="Simulated seconds per LLM call (agentic)")
+    parser.add_argument("--search-latency", type=float, default=0.3,
+                        help="Simulated seconds per search refinement (agentic)")
+    parser.add_argument("--corpus", default=None, help="Directory of recorded sites")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Previous --json output to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed companies/min drop vs baseline (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    modes = ["free", "agentic"] if args.mode == "both" else [args.mode]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    farm_kwargs = {"companies": args.companies, "mix": args.mix,
+                   "slow_delay": args.slow_delay, "port": args.port}
+    if args.corpus:
+        farm_kwargs["corpus_dir"] = args.corpus
+
+    if "agentic" in modes:
+        reason = _agentic_unavailable()
+        if reason:
+            print(f"Agentic benchmark needs Playwright and its browser: {reason}")
+            return 2
+
+    results = []
+    with FixtureFarm(**farm_kwargs) as farm:
+        for mode in modes:
+            for concurrency in levels:
+                result = run_isolated(mode, farm.urls, concurrency, args)
+                print_result(result)
+                results.append(result)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"created_at": time.time(), "args": vars(args), "results": results}, f, indent=2)
+
+    if args.baseline:
+        failures = check_regressions(results, args.baseline, args.max_regression)
+        for line in failures:
+            print(f"REGRESSION: {line}")
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sites")
+
+# Site kinds served by the farm
+KINDS = ["static", "js", "slow", "dead"]
+
+
+def load_corpus(corpus_dir=FIXTURE_DIR):
+    """
+    Return {"static": [dirs], "js": [dirs]} from a corpus directory.
+    Each recorded site is a sub-directory; names ending in `_js` only
+    render their addresses client-side.
+    """
+    corpus = {"static": [], "js": []}
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if os.path.isdir(path):
+            corpus["js" if name.endswith("_js") else "static"].append(path)
+    if not corpus["static"]:
+        raise ValueError(f"No static sites found in {corpus_dir}")
+    if not corpus["js"]:
+        corpus["js"] = corpus["static"]
+    return corpus
+
+
+def parse_mix(spec):
+    """Parse 'static=6,js=2,slow=1,dead=1' into a weight dict"""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"Unknown site kind '{kind}' (expected one of {KINDS})")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def _handler_for(site_dir, delay):
+    class SiteHandler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=site_dir, **kwargs)
+
+        def do_GET(self):
+            if delay:
+                time.sleep(delay)
+            super().do_GET()
+
+        def log_message(self, format, *args):
+            pass
+
+    return SiteHandler
+
+
+class FixtureFarm:
+    """
+    Serves a corpus of recorded company sites over local HTTP.
+
+    Every company gets its own loopback address (127.0.1.1, 127.0.1.2, ...)
+    so per-host logic such as the circuit breaker behaves as it would on
+    the live web. Requires a Linux-style loopback that accepts all of 127/8.
+    Dead hosts get an address with nothing listening (connection refused).
+    """
+
+    def __init__(self, companies=20, mix="static=6,js=2,slow=1,dead=1",
+                 slow_delay=2.0, corpus_dir=FIXTURE_DIR, port=18080):
+        self.companies = companies
+        self.mix = parse_mix(mix) if isinstance(mix, str) else dict(mix)
+        self.slow_delay = slow_delay
+        self.corpus = load_corpus(corpus_dir)
+        self.port = port
+        self.sites = []  # [(url, kind)]
+        self._servers = []
+
+    def _kind_cycle(self):
+        cycle = []
+        for kind in KINDS:
+            cycle += [kind] * self.mix.get(kind, 0)
+        return cycle or ["static"]
+
+    def start(self):
+        cycle = self._kind_cycle()
+        for i in range(self.companies):
+            kind = cycle[i % len(cycle)]
+            host = f"127.0.{1 + i // 250}.{1 + i % 250}"
+            url = f"http://{host}:{self.port}/index.html"
+            self.sites.append((url, kind))
+            if kind == "dead":
+                continue
+
+            pool = self.corpus["js"] if kind == "js" else self.corpus["static"]
+            site_dir = pool[i % len(pool)]
+            delay = self.slow_delay if kind == "slow" else 0
+            server = ThreadingHTTPServer((host, self.port), _handler_for(site_dir, delay))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    @property
+    def urls(self):
+        return [url for url, _ in self.sites]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
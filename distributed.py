@@ -0,0 +1,502 @@
+"""
+Sharded execution for very large bulk files.
+
+A coordinator splits a bulk file into work units (chunks of companies) in a
+queue; workers lease units, heartbeat while extracting, and push their rows
+back. Leases that stop heartbeating expire and the unit is handed to another
+worker. The coordinator merges every unit's rows, in input order, into the
+usual DESIRED_COLS output.
+
+Queue backends (pick with a URL):
+    sqlite:///path/queue.db   single host: many worker processes on one machine,
+                              file on local disk (SQLite locking is not reliable
+                              on network filesystems)
+    redis://host:6379/0       multiple hosts; Redis-compatible server (needs `redis`)
+    memory://                 in-process stand-in for tests
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import metrics
+from extraction import results_frame, write_output, run_batch
+
+DEFAULT_UNIT_SIZE = 100
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class MemoryWorkQueue:
+    """In-process work queue with the same lease semantics as the shared ones"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create_job(self, job_id, config, units):
+        with self._lock:
+            self._jobs[job_id] = {
+                "config": dict(config),
+                "units": {
+                    unit_id: {"payload": payload, "state": "pending", "worker_id": None,
+                              "lease_expires": 0.0, "attempts": 0, "result": None, "error": None}
+                    for unit_id, payload in units
+                },
+            }
+
+    def clock(self):
+        return time.time()
+
+    def job_config(self, job_id):
+        with self._lock:
+            return dict(self._jobs[job_id]["config"])
+
+    def lease(self, job_id, worker_id, lease_seconds, max_attempts):
+        now = time.time()
+        with self._lock:
+            for unit_id, unit in sorted(self._jobs[job_id]["units"].items()):
+                leasable = unit["state"] == "pending" or (
+                    unit["state"] == "leased" and unit["lease_expires"] < now)
+                if leasable and unit["attempts"] < max_attempts:
+                    unit.update(state="leased", worker_id=worker_id,
+                                lease_expires=now + lease_seconds, attempts=unit["attempts"] + 1)
+                    return unit_id, unit["payload"]
+        return None
+
+    def heartbeat(self, job_id, unit_id, worker_id, lease_seconds):
+        with self._lock:
+            unit = self._jobs[job_id]["units"][unit_id]
+            if unit["state"] != "leased" or unit["worker_id"] != worker_id:
+                return False
+            unit["lease_expires"] = time.time() + lease_seconds
+            return True
+
+    def complete(self, job_id, unit_id, worker_id, rows):
+        with self._lock:
+            unit = self._jobs[job_id]["units"][unit_id]
+            if unit["state"] != "leased" or unit["worker_id"] != worker_id:
+                return False
+            unit.update(state="done", result=rows, lease_expires=0.0)
+            return True
+
+    def fail(self, job_id, unit_id, worker_id, error, max_attempts):
+        with self._lock:
+            unit = self._jobs[job_id]["units"][unit_id]
+            if unit["state"] != "leased" or unit["worker_id"] != worker_id:
+                return False
+            state = "failed" if unit["attempts"] >= max_attempts else "pending"
+            unit.update(state=state, error=error, worker_id=None, lease_expires=0.0)
+            return True
+
+    def units(self, job_id):
+        """[(unit_id, state, attempts, lease_expires, error)]"""
+        with self._lock:
+            return [(uid, u["state"], u["attempts"], u["lease_expires"], u["error"])
+                    for uid, u in sorted(self._jobs[job_id]["units"].items())]
+
+    def results(self, job_id):
+        """{unit_id: rows} for completed units"""
+        with self._lock:
+            return {uid: list(u["result"]) for uid, u in self._jobs[job_id]["units"].items()
+                    if u["state"] == "done"}
+
+
+class SQLiteWorkQueue:
+    """
+    Work queue in a SQLite file for workers on one host; leases are claimed
+    with guarded UPDATEs. Use RedisWorkQueue to spread workers over hosts.
+    """
+
+    def __init__(self, db_path, busy_timeout_ms=30000):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.init_database()
+
+    @contextmanager
+    def _connection(self):
+        """Short-lived connection per operation; commits on success, rolls back on error"""
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        try:
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def init_database(self):
+        with self._connection() as conn:
+            # Rollback journal (SQLite's default, undoes WAL left by older versions)
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    config TEXT NOT NULL,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS units (
+                    job_id TEXT NOT NULL,
+                    unit_id INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    worker_id TEXT,
+                    lease_expires REAL DEFAULT 0,
+                    attempts INTEGER DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, unit_id)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_units_job_state
+                ON units (job_id, state, lease_expires)
+            """)
+
+    def create_job(self, job_id, config, units):
+        with self._connection() as conn:
+            conn.execute("INSERT INTO jobs (job_id, config) VALUES (?, ?)", (job_id, json.dumps(config)))
+            conn.executemany(
+                "INSERT INTO units (job_id, unit_id, payload) VALUES (?, ?, ?)",
+                [(job_id, unit_id, json.dumps(payload)) for unit_id, payload in units]
+            )
+
+    def clock(self):
+        # One host, so the local clock is shared by every worker
+        return time.time()
+
+    def job_config(self, job_id):
+        with self._connection() as conn:
+            row = conn.execute("SELECT config FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if not row:
+            raise KeyError(job_id)
+        return json.loads(row[0])
+
+    def lease(self, job_id, worker_id, lease_seconds, max_attempts):
+        leasable = """
+            job_id = ? AND attempts < ?
+            AND (state = 'pending' OR (state = 'leased' AND lease_expires < ?))
+        """
+        while True:
+            now = time.time()
+            with self._connection() as conn:
+                row = conn.execute(
+                    f"SELECT unit_id, payload FROM units WHERE {leasable} ORDER BY unit_id LIMIT 1",
+                    (job_id, max_attempts, now)
+                ).fetchone()
+                if not row:
+                    return None
+                # Another worker may have claimed it since the SELECT; retry if so
+                claimed = conn.execute(f"""
+                    UPDATE units
+                    SET state = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1
+                    WHERE unit_id = ? AND {leasable}
+                """, (worker_id, now + lease_seconds, row[0], job_id, max_attempts, now)).rowcount
+            if claimed:
+                return row[0], json.loads(row[1])
+
+    def heartbeat(self, job_id, unit_id, worker_id, lease_seconds):
+        with self._connection() as conn:
+            return conn.execute("""
+                UPDATE units SET lease_expires = ?
+                WHERE job_id = ? AND unit_id = ? AND worker_id = ? AND state = 'leased'
+            """, (time.time() + lease_seconds, job_id, unit_id, worker_id)).rowcount > 0
+
+    def complete(self, job_id, unit_id, worker_id, rows):
+        with self._connection() as conn:
+            return conn.execute("""
+                UPDATE units SET state = 'done', result = ?, lease_expires = 0
+                WHERE job_id = ? AND unit_id = ? AND worker_id = ? AND state = 'leased'
+            """, (json.dumps(rows), job_id, unit_id, worker_id)).rowcount > 0
+
+    def fail(self, job_id, unit_id, worker_id, error, max_attempts):
+        with self._connection() as conn:
+            return conn.execute("""
+                UPDATE units
+                SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    error = ?, worker_id = NULL, lease_expires = 0
+                WHERE job_id = ? AND unit_id = ? AND worker_id = ? AND state = 'leased'
+            """, (max_attempts, error, job_id, unit_id, worker_id)).rowcount > 0
+
+    def units(self, job_id):
+        with self._connection() as conn:
+            return conn.execute("""
+                SELECT unit_id, state, attempts, lease_expires, error
+                FROM units WHERE job_id = ? ORDER BY unit_id
+            """, (job_id,)).fetchall()
+
+    def results(self, job_id):
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT unit_id, result FROM units WHERE job_id = ? AND state = 'done'", (job_id,)
+            ).fetchall()
+        return {unit_id: json.loads(result) for unit_id, result in rows}
+
+
+# Lua scripts so every lease transition is a single atomic step on the server.
+# Lease expiry uses the server clock so worker hosts with skewed clocks agree.
+_REDIS_NOW = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+"""
+
+# Lease: requeue expired leases, then pop the first unit that has attempts left
+_REDIS_LEASE = _REDIS_NOW + """
+local pending, leases, owner, attempts, state, payload =
+    KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5], KEYS[6]
+for _, u in ipairs(redis.call('ZRANGEBYSCORE', leases, '-inf', '(' .. now)) do
+    redis.call('ZREM', leases, u)
+    redis.call('HDEL', owner, u)
+    redis.call('HSET', state, u, 'pending')
+    redis.call('RPUSH', pending, u)
+end
+while true do
+    local u = redis.call('LPOP', pending)
+    if not u then return nil end
+    if tonumber(redis.call('HGET', attempts, u) or '0') >= tonumber(ARGV[3]) then
+        redis.call('HSET', state, u, 'failed')
+    else
+        redis.call('HINCRBY', attempts, u, 1)
+        redis.call('HSET', owner, u, ARGV[1])
+        redis.call('ZADD', leases, now + tonumber(ARGV[2]), u)
+        redis.call('HSET', state, u, 'leased')
+        return {u, redis.call('HGET', payload, u)}
+    end
+end
+"""
+
+_REDIS_HEARTBEAT = _REDIS_NOW + """
+if redis.call('HGET', KEYS[1], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZADD', KEYS[2], 'XX', now + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+_REDIS_COMPLETE = """
+if redis.call('HGET', KEYS[1], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+redis.call('HSET', KEYS[4], ARGV[1], 'done')
+return 1
+"""
+
+_REDIS_FAIL = """
+if redis.call('HGET', KEYS[1], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+if tonumber(redis.call('HGET', KEYS[5], ARGV[1]) or '0') >= tonumber(ARGV[4]) then
+    redis.call('HSET', KEYS[4], ARGV[1], 'failed')
+else
+    redis.call('HSET', KEYS[4], ARGV[1], 'pending')
+    redis.call('RPUSH', KEYS[6], ARGV[1])
+end
+return 1
+"""
+
+
+class RedisWorkQueue:
+    """
+    Work queue on a Redis-compatible server, for workers on many hosts.
+    Per job: a pending list, a lease sorted set (score = expiry) and hashes
+    for payloads, owners, attempts, states, results and errors; every lease
+    transition runs as one Lua script.
+    """
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.r = client
+        self._lease_script = self.r.register_script(_REDIS_LEASE)
+        self._heartbeat_script = self.r.register_script(_REDIS_HEARTBEAT)
+        self._complete_script = self.r.register_script(_REDIS_COMPLETE)
+        self._fail_script = self.r.register_script(_REDIS_FAIL)
+
+    def _key(self, job_id, name):
+        return f"addressintel:{job_id}:{name}"
+
+    def create_job(self, job_id, config, units):
+        pipe = self.r.pipeline()
+        pipe.set(self._key(job_id, "config"), json.dumps(config))
+        for unit_id, payload in units:
+            pipe.hset(self._key(job_id, "payload"), unit_id, json.dumps(payload))
+            pipe.rpush(self._key(job_id, "pending"), unit_id)
+        pipe.execute()
+
+    def clock(self):
+        """Server time; lease expiries are scored against it, not the worker's clock"""
+        seconds, micros = self.r.time()
+        return seconds + micros / 1e6
+
+    def job_config(self, job_id):
+        raw = self.r.get(self._key(job_id, "config"))
+        if raw is None:
+            raise KeyError(job_id)
+        return json.loads(raw)
+
+    def lease(self, job_id, worker_id, lease_seconds, max_attempts):
+        keys = [self._key(job_id, name) for name in
+                ("pending", "leases", "owner", "attempts", "state", "payload")]
+        leased = self._lease_script(keys=keys, args=[worker_id, lease_seconds, max_attempts])
+        if not leased:
+            return None
+        unit_id, payload = leased
+        return int(unit_id), json.loads(payload)
+
+    def heartbeat(self, job_id, unit_id, worker_id, lease_seconds):
+        keys = [self._key(job_id, "owner"), self._key(job_id, "leases")]
+        return bool(self._heartbeat_script(keys=keys, args=[unit_id, worker_id, lease_seconds]))
+
+    def complete(self, job_id, unit_id, worker_id, rows):
+        keys = [self._key(job_id, name) for name in ("owner", "leases", "result", "state")]
+        return bool(self._complete_script(keys=keys, args=[unit_id, worker_id, json.dumps(rows)]))
+
+    def fail(self, job_id, unit_id, worker_id, error, max_attempts):
+        keys = [self._key(job_id, name) for name in
+                ("owner", "leases", "error", "state", "attempts", "pending")]
+        return bool(self._fail_script(keys=keys, args=[unit_id, worker_id, error, max_attempts]))
+
+    def units(self, job_id):
+        unit_ids = sorted(int(u) for u in self.r.hkeys(self._key(job_id, "payload")))
+        states = self.r.hgetall(self._key(job_id, "state"))
+        attempts = self.r.hgetall(self._key(job_id, "attempts"))
+        errors = self.r.hgetall(self._key(job_id, "error"))
+        leases = dict(self.r.zrange(self._key(job_id, "leases"), 0, -1, withscores=True))
+        return [(u, states.get(str(u), "pending"), int(attempts.get(str(u), 0)),
+                 leases.get(str(u), 0.0), errors.get(str(u))) for u in unit_ids]
+
+    def results(self, job_id):
+        return {int(u): json.loads(rows)
+                for u, rows in self.r.hgetall(self._key(job_id, "result")).items()}
+
+
+_memory_queues = {}
+
+def open_queue(url):
+    """Open a work queue from a sqlite:///, redis:// or memory:// URL"""
+    if url.startswith("sqlite:///"):
+        return SQLiteWorkQueue(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisWorkQueue(url)
+    if url.startswith("memory://"):
+        return _memory_queues.setdefault(url, MemoryWorkQueue())
+    raise ValueError(f"Unsupported queue URL: {url}")
+
+
+# ---------------- COORDINATOR ----------------
+def submit_job(queue, input_data, mode="free", proxy_url=None, unit_size=DEFAULT_UNIT_SIZE,
+               lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+               concurrency=4, job_id=None):
+    """Split bulk records into units of `unit_size` companies; returns the job id"""
+    job_id = job_id or uuid.uuid4().hex[:12]
+    records = [{"COMPANY NAME": item.get("COMPANY NAME", "Unknown"),
+                "OFFICIAL WEBSITE": item.get("OFFICIAL WEBSITE", "")} for item in input_data]
+    units = [(i // unit_size, records[i:i + unit_size]) for i in range(0, len(records), unit_size)]
+    config = {"mode": mode, "proxy_url": proxy_url, "lease_seconds": lease_seconds,
+              "max_attempts": max_attempts, "concurrency": concurrency, "companies": len(records)}
+    queue.create_job(job_id, config, units)
+    return job_id
+
+
+def job_status(queue, job_id):
+    """Counts of units per state; expired leases are reported separately"""
+    now = queue.clock()
+    max_attempts = queue.job_config(job_id)["max_attempts"]
+    counts = {"pending": 0, "leased": 0, "expired": 0, "done": 0, "failed": 0}
+    for _, state, attempts, lease_expires, _ in queue.units(job_id):
+        if state == "leased" and lease_expires < now:
+            state = "expired" if attempts < max_attempts else "failed"
+        counts[state] += 1
+    counts["total"] = sum(counts.values())
+    counts["finished"] = counts["done"] + counts["failed"] == counts["total"]
+    return counts
+
+
+def merge_results(queue, job_id, allow_partial=False):
+    """Merge unit rows (in input order) into the DESIRED_COLS DataFrame"""
+    status = job_status(queue, job_id)
+    if not allow_partial and status["done"] != status["total"]:
+        raise RuntimeError(f"Job {job_id} is not complete: {status}")
+    results = queue.results(job_id)
+    rows = [row for unit_id in sorted(results) for row in results[unit_id]]
+    return results_frame(rows)
+
+
+# ---------------- WORKER ----------------
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _Heartbeat(threading.Thread):
+    """Extends a unit's lease every lease_seconds / 3 until stopped"""
+
+    def __init__(self, queue, job_id, unit_id, worker_id, lease_seconds):
+        super().__init__(daemon=True)
+        self.args = (queue, job_id, unit_id, worker_id, lease_seconds)
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        queue, job_id, unit_id, worker_id, lease_seconds = self.args
+        while not self.stopped.wait(lease_seconds / 3):
+            try:
+                alive = queue.heartbeat(job_id, unit_id, worker_id, lease_seconds)
+            except Exception:
+                # Locked database / connection blip: the lease may still be ours, retry
+                continue
+            if not alive:
+                self.lost = True
+                return
+
+
+def run_worker(queue, job_id, api_key=None, worker_id=None, wait=False, poll_seconds=5.0,
+               log=print):
+    """
+    Lease and process units until none are left (or, with wait=True, until the
+    job is finished). Returns the number of units this worker completed.
+    """
+    worker_id = worker_id or default_worker_id()
+    config = queue.job_config(job_id)
+    lease_seconds = config["lease_seconds"]
+    completed = 0
+
+    while True:
+        leased = queue.lease(job_id, worker_id, lease_seconds, config["max_attempts"])
+        if leased is None:
+            if wait and not job_status(queue, job_id)["finished"]:
+                time.sleep(poll_seconds)
+                continue
+            return completed
+
+        unit_id, payload = leased
+        log(f"[{worker_id}] unit {unit_id}: {len(payload)} companies")
+        heartbeat = _Heartbeat(queue, job_id, unit_id, worker_id, lease_seconds)
+        heartbeat.start()
+        try:
+            with metrics.span("unit"):
+                rows = run_batch(payload, mode=config["mode"], api_key=api_key,
+                                 proxy_url=config["proxy_url"], concurrency=config["concurrency"])
+        except Exception as e:
+            heartbeat.stopped.set()
+            queue.fail(job_id, unit_id, worker_id, str(e), config["max_attempts"])
+            log(f"[{worker_id}] unit {unit_id} failed: {e}")
+            continue
+        heartbeat.stopped.set()
+
+        if heartbeat.lost or not queue.complete(job_id, unit_id, worker_id, rows):
+            log(f"[{worker_id}] unit {unit_id}: lease lost, result discarded")
+            continue
+        completed += 1
+        metrics.incr("units")
+
+
+def merge_to_file(queue, job_id, output_path, allow_partial=False):
+    final_df = merge_results(queue, job_id, allow_partial)
+    write_output(final_df, output_path)
+    return len(final_df)
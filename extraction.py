@@ -0,0 +1,350 @@
+import os
+import re
+import threading
+import contextvars
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+
+import metrics
+
+# Import Agentic Logic (cheap: its heavy dependencies load on first use)
+try:
+    from agent_logic import AgenticExtractor, agentic_available
+except ImportError:
+    AgenticExtractor = None
+
+# ---------------- CONFIG ----------------
+MODES = ["free", "agentic"]
+
+# Output schema shared by the Streamlit app, CLI and API
+DESIRED_COLS = [
+    "COMPANY NAME", "COMPANY WEBSITE",
+    "STREET ADDRESS1", "STREET ADDRESS2", "CITY NAME", 
+    "STATE NAME", "PIN CODE", "COUNTRY NAME", "ADDRESS SOURCE LINK"
+]
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+}
+
+ADDRESS_KEYWORDS = [
+    "head office", "headquarters", "hq",
+    "office", "corporate office",
+    "factory", "manufacturing",
+    "plant", "facility",
+    "branch", "location", "unit", "plot no"
+]
+
+CONTACT_HINTS = [
+    "contact", "about", "location",
+    "branch", "office", "factory", "connect"
+]
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# ---------------- HELPERS (Reused from previous version) ----------------
+def http_session():
+    """Shared requests.Session so pages, companies and reruns reuse connections"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=32)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+            _http_session = session
+        return _http_session
+
+def fetch_html(url, breaker=None):
+    if breaker and breaker.is_open(url):
+        metrics.incr("host_cache_hits")
+        return None
+    try:
+        with metrics.span("fetch"):
+            r = http_session().get(url, timeout=15)
+        metrics.incr("pages")
+        metrics.incr("bytes", len(r.content))
+        if breaker:
+            breaker.record_success(url)
+        if r.status_code == 200:
+            return r.text
+        metrics.incr("http_errors")
+    except (requests.exceptions.SSLError, requests.exceptions.ProxyError):
+        # Bad certificate on one page / broken local proxy: not a dead host
+        metrics.incr("errors")
+    except requests.exceptions.Timeout:
+        metrics.incr("errors")
+        if breaker:
+            breaker.record_failure(url, "timeout")
+    except requests.exceptions.ConnectionError:
+        metrics.incr("errors")
+        if breaker:
+            breaker.record_failure(url, "connect")
+    except Exception:
+        metrics.incr("errors")
+    return None
+
+def find_relevant_pages(base_url, soup):
+    links = set()
+    for a in soup.find_all("a", href=True):
+        href = a["href"].lower()
+        text = a.get_text(strip=True).lower()
+        if any(k in href or k in text for k in CONTACT_HINTS):
+            full_url = urljoin(base_url, a["href"])
+            links.add(full_url)
+    return list(links)[:5]
+
+def extract_physical_addresses_simple(text):
+    lines = [l.strip() for l in text.splitlines() if len(l.strip()) > 10]
+    results = []
+    for line in lines:
+        low = line.lower()
+        if "copyright" in low or "rights reserved" in low or "subscribe" in low:
+            continue
+        if any(k in low for k in ADDRESS_KEYWORDS):
+            if re.search(r"\d", line) and re.search(r"\broad|\bstreet|\bave|\bblvd|\bsector|\bindustrial|\bplot|\bbox\b", low):
+                results.append(line)
+            elif re.search(r"[a-zA-Z]+.*-.*\d{3,}", line): # Pincode heuristic
+               results.append(line)
+    return list(set(results))
+
+def process_url_free(url, breaker=None):
+    with metrics.span("process_url_free"):
+        return _process_url_free(url, breaker)
+
+def _process_url_free(url, breaker=None):
+    extracted = []
+    html = fetch_html(url, breaker)
+    if not html:
+        return [{"RAW_ADDRESS": "Website Unreachable", "SOURCE": url}]
+
+    with metrics.span("parse"):
+        soup = BeautifulSoup(html, "html.parser")
+    pages = find_relevant_pages(url, soup)
+    pages.insert(0, url)
+
+    found_any = False
+    
+    # Progress indicator within the function for better UX?
+    # Streamlit renders procedurally, so we can't easily yield updates from inside a helper without passing a placeholder.
+    # We'll just run it.
+    
+    for page in pages:
+        p_html = fetch_html(page, breaker)
+        if not p_html: continue
+        
+        with metrics.span("parse"):
+            text = BeautifulSoup(p_html, "html.parser").get_text("\n")
+        raw_addrs = extract_physical_addresses_simple(text)
+        
+        for addr in raw_addrs:
+            found_any = True
+            extracted.append({
+                "STREET": addr[:100], 
+                "CITY": "", "STATE": "", "ZIP": "", "COUNTRY": "",
+                "SOURCE_LINK": page,
+                "MODE": "Free"
+            })
+            
+    if not found_any:
+         extracted.append({
+                "STREET": "Not Found",
+                "CITY": "", "STATE": "", "ZIP": "", "COUNTRY": "",
+                "SOURCE_LINK": url,
+                "MODE": "Free"
+            })
+            
+    return extracted
+
+def is_failure_result(raw_data):
+    """True if extract_company returned only an unreachable / not-found / error row"""
+    for row in raw_data:
+        street = str(row.get("STREET", ""))
+        if not (row.get("RAW_ADDRESS") == "Website Unreachable" or
+                street == "Not Found" or street.startswith("Error:")):
+            return False
+    return True
+
+def process_url_agentic(url, api_key, proxy_url=None, breaker=None, agent=None):
+    if not AgenticExtractor or not agentic_available():
+        return [{"STREET": "Error: Agent Logic not loaded", "SOURCE_LINK": ""}]
+    if not api_key:
+         return [{"STREET": "Error: OpenAI API Key Required", "SOURCE_LINK": ""}]
+
+    if agent is None:
+        agent = AgenticExtractor(openai_api_key=api_key, proxy_url=proxy_url)
+    data = agent.process_url(url, breaker)
+    
+    formatted_rows = []
+    if not data:
+        formatted_rows.append({
+             "STREET": "Not Found", "CITY":"", "STATE":"", "ZIP":"", "COUNTRY":"", "SOURCE_LINK": url, "MODE": "Agentic"
+        })
+    
+    for item in data:
+        formatted_rows.append({
+            "STREET": item.get("street", ""),
+            "CITY": item.get("city", ""),
+            "STATE": item.get("state", ""),
+            "ZIP": item.get("zip", ""),
+            "COUNTRY": item.get("country", ""),
+            "SOURCE_LINK": item.get("source_url", ""),
+            "MODE": "Agentic"
+        })
+        
+    return formatted_rows
+
+def normalize_url(url):
+    """Clean up a website cell; returns '' for blanks/NaN"""
+    if url is None or url != url:  # NaN from pandas
+        return ""
+    url = str(url).strip()
+    if url and not url.startswith("http"):
+        url = "https://" + url
+    return url
+
+def extract_company(url, mode="free", api_key=None, proxy_url=None, breaker=None, agent=None):
+    """Dispatch one website to Free or Agentic extraction"""
+    if mode == "free":
+        return process_url_free(url, breaker)
+    return process_url_agentic(url, api_key, proxy_url, breaker, agent)
+
+def format_rows(raw_data, name, url):
+    """Map raw extractor rows onto the output columns"""
+    rows = []
+    for row in raw_data:
+        # Map standard columns
+        # Free mode returns STREET only, Agentic returns structured
+        row["COMPANY NAME"] = name
+        row["COMPANY WEBSITE"] = url
+        
+        # Handle split street for free mode (dummy split)
+        if "STREET" in row and "STREET ADDRESS1" not in row:
+            row["STREET ADDRESS1"] = row["STREET"]
+            row["STREET ADDRESS2"] = ""
+        
+        # Agentic mode returns street1/street2 map to correct keys
+        if "street1" in row: row["STREET ADDRESS1"] = row["street1"]
+        if "street2" in row: row["STREET ADDRESS2"] = row["street2"]
+        if "city" in row: row["CITY NAME"] = row["city"]
+        if "state" in row: row["STATE NAME"] = row["state"]
+        if "zip" in row: row["PIN CODE"] = row["zip"]
+        if "country" in row: row["COUNTRY NAME"] = row["country"]
+        if "source_url" in row: row["ADDRESS SOURCE LINK"] = row["source_url"]
+        if "SOURCE_LINK" in row: row["ADDRESS SOURCE LINK"] = row["SOURCE_LINK"]
+        
+        rows.append(row)
+    return rows
+
+def results_frame(rows):
+    """Build the final DataFrame restricted to DESIRED_COLS"""
+    import pandas as pd
+    result_df = pd.DataFrame(rows)
+    # Ensure cols exist
+    for c in DESIRED_COLS:
+        if c not in result_df.columns:
+            result_df[c] = ""
+    return result_df[DESIRED_COLS]
+
+def read_input(path_or_buffer, filename=None):
+    """
+    Read a bulk file (.xlsx/.xls/.csv/.parquet) into
+    [{"COMPANY NAME": ..., "OFFICIAL WEBSITE": ...}].
+    Raises ValueError if the required columns are missing.
+    """
+    import pandas as pd
+    name = (filename or str(path_or_buffer)).lower()
+    if name.endswith(".csv"):
+        df_input = pd.read_csv(path_or_buffer)
+    elif name.endswith(".parquet"):
+        df_input = pd.read_parquet(path_or_buffer)
+    else:
+        df_input = pd.read_excel(path_or_buffer)
+    # Normalize Headers
+    df_input.columns = [str(c).upper().strip() for c in df_input.columns]
+    
+    if "COMPANY NAME" in df_input.columns and "OFFICIAL WEBSITE" in df_input.columns:
+        return df_input[["COMPANY NAME", "OFFICIAL WEBSITE"]].to_dict('records')
+    raise ValueError(f"Columns not found. Found: {list(df_input.columns)}")
+
+def write_output(final_df, path):
+    """Write results; format follows the extension (.parquet/.csv/.json/.xlsx)"""
+    low = str(path).lower()
+    if low.endswith(".parquet"):
+        final_df.to_parquet(path, index=False)
+    elif low.endswith(".csv"):
+        final_df.to_csv(path, index=False)
+    elif low.endswith(".json"):
+        final_df.to_json(path, orient="records", indent=2)
+    else:
+        final_df.to_excel(path, index=False)
+
+def check_output_writable(path):
+    """
+    Raise ValueError if results can't be written to `path` (missing directory
+    or missing writer engine), so a long batch doesn't fail at the very end.
+    """
+    low = str(path).lower()
+    directory = os.path.dirname(os.path.abspath(str(path)))
+    if not os.path.isdir(directory):
+        raise ValueError(f"Output directory does not exist: {directory}")
+    if not os.access(directory, os.W_OK):
+        raise ValueError(f"Output directory is not writable: {directory}")
+
+    import importlib.util
+    if low.endswith(".parquet"):
+        if not (importlib.util.find_spec("pyarrow") or importlib.util.find_spec("fastparquet")):
+            raise ValueError("Writing .parquet needs pyarrow (pip install pyarrow)")
+    elif not (low.endswith(".csv") or low.endswith(".json")):
+        if not importlib.util.find_spec("openpyxl"):
+            raise ValueError("Writing .xlsx needs openpyxl (pip install openpyxl)")
+
+def run_batch(input_data, mode="free", api_key=None, proxy_url=None,
+              concurrency=1, breaker=None, on_progress=None):
+    """
+    Extract a list of {"COMPANY NAME", "OFFICIAL WEBSITE"} records.
+    Runs the DNS pre-flight first, then `concurrency` companies at a time.
+    on_progress(done, total, name, url) is called from the calling thread.
+    A company whose extraction raises gets an "Error: ..." row.
+    Returns the formatted rows (input order).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from host_health import HostHealthCache, CircuitBreaker, preflight
+
+    items = []
+    for item in input_data:
+        url = normalize_url(item.get("OFFICIAL WEBSITE", ""))
+        if url:
+            items.append((item.get("COMPANY NAME", "Unknown"), url))
+
+    if breaker is None:
+        breaker = CircuitBreaker(HostHealthCache())
+    with metrics.span("preflight"):
+        preflight([url for _, url in items], cache=breaker.cache, breaker=breaker)
+
+    def work(entry):
+        name, url = entry
+        try:
+            with metrics.span("company"):
+                metrics.incr("companies")
+                raw_data = extract_company(url, mode, api_key, proxy_url, breaker)
+        except Exception as e:
+            # One bad site becomes an error row instead of aborting the whole batch
+            metrics.incr("errors")
+            raw_data = [{"STREET": f"Error: {e}", "SOURCE_LINK": url}]
+        return format_rows(raw_data, name, url)
+
+    all_results = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # Each task runs in a copy of this context so it reports to the same collector
+        futures = [pool.submit(contextvars.copy_context().run, work, entry) for entry in items]
+        for i, future in enumerate(futures):
+            rows = future.result()
+            all_results.extend(rows)
+            if on_progress:
+                on_progress(i + 1, len(items), *items[i])
+    return all_results
@@ -0,0 +1,201 @@
+import sqlite3
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+# How long a host stays blacklisted, by failure kind (seconds)
+DEAD_HOST_TTL = {
+    "dns": 24 * 3600,       # NXDOMAIN / no address records
+    "connect": 6 * 3600,    # refused / reset / unreachable
+    "timeout": 3600,        # slow host, retry sooner
+}
+
+
+def host_of(url):
+    """Return the lowercase hostname of a URL (or '' if it has none)"""
+    if not url:
+        return ""
+    if "://" not in url:
+        url = "https://" + url
+    return (urlparse(url).hostname or "").lower()
+
+
+class HostHealthCache:
+    """Persistent record of dead / timeout-prone hosts with expiry"""
+
+    def __init__(self, db_path="host_health.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Create the dead_hosts table if it doesn't exist"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS dead_hosts (
+                host TEXT PRIMARY KEY,
+                reason TEXT NOT NULL,
+                failures INTEGER DEFAULT 1,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+        conn.commit()
+        conn.close()
+
+    def dead_hosts(self, hosts=None):
+        """Return the set of hosts whose dead entry has not expired yet"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("DELETE FROM dead_hosts WHERE expires_at <= ?", (time.time(),))
+        cursor.execute("SELECT host FROM dead_hosts")
+        dead = {row[0] for row in cursor.fetchall()}
+
+        conn.commit()
+        conn.close()
+
+        if hosts is not None:
+            dead &= set(hosts)
+        return dead
+
+    def mark_dead(self, host, reason="timeout"):
+        """Blacklist a host; repeat offenders stay blacklisted longer"""
+        if not host:
+            return
+        ttl = DEAD_HOST_TTL.get(reason, DEAD_HOST_TTL["timeout"])
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT failures FROM dead_hosts WHERE host = ?", (host,))
+        row = cursor.fetchone()
+        failures = (row[0] + 1) if row else 1
+
+        cursor.execute("""
+            INSERT OR REPLACE INTO dead_hosts (host, reason, failures, expires_at)
+            VALUES (?, ?, ?, ?)
+        """, (host, reason, failures, time.time() + ttl * min(failures, 4)))
+
+        conn.commit()
+        conn.close()
+
+    def mark_alive(self, host):
+        """Forget a host after a successful fetch"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM dead_hosts WHERE host = ?", (host,))
+        conn.commit()
+        conn.close()
+
+
+class CircuitBreaker:
+    """
+    Per-domain circuit breaker shared across one extraction run.
+    Trips on the first hard failure (DNS, refused connection, timeout) so
+    the remaining pages of that company are skipped without waiting.
+    """
+
+    def __init__(self, cache=None, threshold=1):
+        self.cache = cache
+        self.threshold = threshold
+        self._failures = {}
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def is_open(self, url):
+        host = host_of(url)
+        with self._lock:
+            return host in self._open
+
+    def trip(self, host, reason="dns"):
+        """Open the breaker for a host without counting a failure"""
+        with self._lock:
+            self._open[host] = reason
+
+    def record_failure(self, url, reason="timeout"):
+        host = host_of(url)
+        if not host:
+            return
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] < self.threshold or host in self._open:
+                return
+            self._open[host] = reason
+        if self.cache:
+            self.cache.mark_dead(host, reason)
+
+    def record_success(self, url):
+        host = host_of(url)
+        with self._lock:
+            was_failing = self._failures.pop(host, 0)
+        if was_failing and self.cache:
+            self.cache.mark_alive(host)
+
+    @property
+    def open_hosts(self):
+        with self._lock:
+            return dict(self._open)
+
+
+# getaddrinfo errors that mean the name really has no address records;
+# anything else (EAI_AGAIN, EAI_FAIL, overloaded resolver...) is not proof
+_DEAD_DNS_ERRORS = {socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)}
+
+
+def _resolves(host):
+    try:
+        return bool(socket.getaddrinfo(host, 443, proto=socket.IPPROTO_TCP))
+    except socket.gaierror as e:
+        return e.errno not in _DEAD_DNS_ERRORS
+    except UnicodeError:
+        # Not encodable as a hostname (IDNA), can never resolve
+        return False
+    except OSError:
+        # Transient resolver error - don't condemn the host
+        return True
+
+
+def resolve_hosts(hosts, max_workers=32, timeout=10.0):
+    """
+    Resolve DNS for many hosts concurrently.
+    Returns {host: bool}; hosts still pending after `timeout` are assumed alive.
+    """
+    hosts = sorted({h for h in hosts if h})
+    if not hosts:
+        return {}
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(hosts)))
+    futures = {pool.submit(_resolves, h): h for h in hosts}
+    done, _ = wait(futures, timeout=timeout)
+    # Don't block on stragglers; getaddrinfo can't be cancelled
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    results = {h: True for h in hosts}
+    for future in done:
+        results[futures[future]] = future.result()
+    return results
+
+
+def preflight(urls, cache=None, breaker=None, max_workers=32, timeout=10.0):
+    """
+    Pre-flight stage for a bulk list: drop hosts known dead from the cache,
+    resolve the rest concurrently and blacklist those without DNS records.
+    Returns the set of dead hosts; they are also tripped on `breaker`.
+    """
+    hosts = {host_of(u) for u in urls} - {""}
+    dead = cache.dead_hosts(hosts) if cache else set()
+
+    resolved = resolve_hosts(hosts - dead, max_workers=max_workers, timeout=timeout)
+    for host, ok in resolved.items():
+        if not ok:
+            dead.add(host)
+            if cache:
+                cache.mark_dead(host, "dns")
+
+    if breaker:
+        for host in dead:
+            breaker.trip(host)
+    return dead
@@ -0,0 +1,170 @@
+import cProfile
+import contextvars
+import io
+import json
+import math
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Stages timed across a run, in pipeline order (used for display ordering)
+STAGES = [
+    "preflight", "company", "process_url_free", "process_url",
+    "fetch", "parse", "navigate", "llm", "search",
+]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (q in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class RunMetrics:
+    """
+    Per-stage timing spans and counters for one extraction run.
+    With max_samples set (long-running collectors such as the API server),
+    percentiles cover the most recent max_samples spans per stage; count,
+    total and max always cover every span.
+    """
+
+    def __init__(self, max_samples=None):
+        self.started_at = time.time()
+        self.finished_at = None
+        self.max_samples = max_samples
+        self.spans = {}
+        self.counters = {}
+        self._totals = {}  # stage -> (count, total_s, max_s)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            # Per-stage only; the total "errors" is counted where errors are handled
+            self.incr(f"errors.{stage}")
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if stage not in self.spans:
+                    self.spans[stage] = deque(maxlen=self.max_samples)
+                self.spans[stage].append(elapsed)
+                count, total, peak = self._totals.get(stage, (0, 0.0, 0.0))
+                self._totals[stage] = (count + 1, total + elapsed, max(peak, elapsed))
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        """Freeze the wall-clock time (e.g. before storing a finished run)"""
+        self.finished_at = time.time()
+
+    def summary(self):
+        """Return {stage: {count, total_s, p50_s, p95_s, max_s}}"""
+        with self._lock:
+            spans = {k: list(v) for k, v in self.spans.items()}
+            totals = dict(self._totals)
+        order = {s: i for i, s in enumerate(STAGES)}
+        result = {}
+        for stage in sorted(spans, key=lambda s: (order.get(s, len(STAGES)), s)):
+            values = spans[stage]
+            count, total, peak = totals[stage]
+            result[stage] = {
+                "count": count,
+                "total_s": round(total, 4),
+                "p50_s": round(percentile(values, 50), 4),
+                "p95_s": round(percentile(values, 95), 4),
+                "max_s": round(peak, 4),
+            }
+        return result
+
+    def to_dict(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "started_at": self.started_at,
+            "wall_s": round((self.finished_at or time.time()) - self.started_at, 4),
+            "stages": self.summary(),
+            "counters": counters,
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix="addressintel"):
+        """Render in Prometheus text exposition format"""
+        data = self.to_dict()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent per extraction stage",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, s in data["stages"].items():
+            lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="0.5"}} {s["p50_s"]}')
+            lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="0.95"}} {s["p95_s"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {s["total_s"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in sorted(data["counters"].items()):
+            lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class _NullMetrics:
+    """Stand-in used when no run is being collected"""
+
+    @contextmanager
+    def span(self, stage):
+        yield
+
+    def incr(self, name, n=1):
+        pass
+
+
+_NULL = _NullMetrics()
+# Per-context (so per Streamlit session thread / request) active collector.
+# Worker threads don't inherit it: submit work with contextvars.copy_context().run
+_active = contextvars.ContextVar("addressintel_metrics", default=_NULL)
+
+
+def current():
+    """Return the collector of the active run (a no-op one if none)"""
+    return _active.get()
+
+
+def span(stage):
+    return _active.get().span(stage)
+
+
+def incr(name, n=1):
+    _active.get().incr(name, n)
+
+
+@contextmanager
+def collect(run_metrics=None):
+    """Make `run_metrics` (or a fresh RunMetrics) the active collector in this context"""
+    token = _active.set(run_metrics or RunMetrics())
+    try:
+        yield _active.get()
+    finally:
+        _active.reset(token)
+
+
+def profile_call(fn, *args, top=30, sort="cumulative", **kwargs):
+    """
+    Run fn under cProfile (opt-in, meant for a single company).
+    Returns (result, report_text).
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats(sort).print_stats(top)
+    return result, out.getvalue()
@@ -0,0 +1,167 @@
+import time
+import types
+
+import pytest
+
+import distributed
+from distributed import (
+    MemoryWorkQueue, SQLiteWorkQueue, RedisWorkQueue, submit_job, job_status, merge_results
+)
+
+
+def _redis_queue():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return RedisWorkQueue(client=fakeredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "memory":
+        return MemoryWorkQueue()
+    if request.param == "sqlite":
+        return SQLiteWorkQueue(str(tmp_path / "queue.db"))
+    return _redis_queue()
+
+
+def _companies(n):
+    return [{"COMPANY NAME": f"Company {i}", "OFFICIAL WEBSITE": f"company{i}.example"}
+            for i in range(n)]
+
+
+def _rows_for(payload):
+    return [{"COMPANY NAME": c["COMPANY NAME"], "COMPANY WEBSITE": c["OFFICIAL WEBSITE"]}
+            for c in payload]
+
+
+def test_expired_lease_is_reassigned_and_stale_result_rejected(queue):
+    job_id = submit_job(queue, _companies(3), unit_size=10, lease_seconds=0.05)
+
+    unit_id, payload = queue.lease(job_id, "a", 0.05, 3)
+    assert queue.lease(job_id, "b", 0.05, 3) is None
+
+    time.sleep(0.1)
+    assert job_status(queue, job_id)["expired"] == 1
+    assert queue.lease(job_id, "b", 60, 3) == (unit_id, payload)
+
+    # The first worker's lease is gone: no heartbeat, no result
+    assert not queue.heartbeat(job_id, unit_id, "a", 60)
+    assert not queue.complete(job_id, unit_id, "a", _rows_for(payload))
+    assert queue.heartbeat(job_id, unit_id, "b", 60)
+    assert queue.complete(job_id, unit_id, "b", _rows_for(payload))
+
+    status = job_status(queue, job_id)
+    assert status["done"] == 1 and status["finished"]
+    assert [u[2] for u in queue.units(job_id)] == [2]
+
+
+def test_unit_fails_after_max_attempts(queue):
+    job_id = submit_job(queue, _companies(2), unit_size=10, max_attempts=2)
+
+    for attempt in range(2):
+        unit_id, _ = queue.lease(job_id, "w", 60, 2)
+        assert queue.fail(job_id, unit_id, "w", f"boom {attempt}", 2)
+
+    assert queue.lease(job_id, "w", 60, 2) is None
+    status = job_status(queue, job_id)
+    assert status["failed"] == 1 and status["finished"]
+    assert queue.units(job_id)[0][4] == "boom 1"
+    with pytest.raises(RuntimeError):
+        merge_results(queue, job_id)
+
+
+def test_expired_lease_counts_as_an_attempt(queue):
+    job_id = submit_job(queue, _companies(1), unit_size=10, max_attempts=1, lease_seconds=0.05)
+
+    assert queue.lease(job_id, "a", 0.05, 1) is not None
+    time.sleep(0.1)
+    assert queue.lease(job_id, "b", 0.05, 1) is None
+    assert job_status(queue, job_id)["failed"] == 1
+
+
+def test_merge_keeps_input_order(queue):
+    companies = _companies(7)
+    job_id = submit_job(queue, companies, unit_size=2)
+
+    leased = []
+    while True:
+        unit = queue.lease(job_id, "w", 60, 3)
+        if unit is None:
+            break
+        leased.append(unit)
+    assert len(leased) == 4
+
+    for unit_id, payload in reversed(leased):
+        assert queue.complete(job_id, unit_id, "w", _rows_for(payload))
+
+    merged = merge_results(queue, job_id)
+    assert list(merged["COMPANY NAME"]) == [c["COMPANY NAME"] for c in companies]
+
+
+def test_run_worker_processes_every_unit(queue, monkeypatch):
+    failed_once = set()
+
+    def fake_run_batch(payload, **kwargs):
+        # First attempt at the second unit fails; the retry succeeds
+        first = payload[0]["COMPANY NAME"]
+        if first == "Company 2" and first not in failed_once:
+            failed_once.add(first)
+            raise RuntimeError("transient")
+        return _rows_for(payload)
+
+    monkeypatch.setattr(distributed, "run_batch", fake_run_batch)
+    companies = _companies(5)
+    job_id = submit_job(queue, companies, unit_size=2)
+
+    completed = distributed.run_worker(queue, job_id, worker_id="w", log=lambda msg: None)
+    assert completed == 3
+    assert failed_once == {"Company 2"}
+    assert job_status(queue, job_id)["done"] == 3
+    assert list(merge_results(queue, job_id)["COMPANY NAME"]) == [c["COMPANY NAME"] for c in companies]
+
+
+def test_heartbeat_survives_transient_errors(queue):
+    job_id = submit_job(queue, _companies(1), unit_size=10)
+    unit_id, _ = queue.lease(job_id, "w", 0.3, 3)
+
+    class Flaky:
+        calls = 0
+
+        def heartbeat(self, *args):
+            Flaky.calls += 1
+            if Flaky.calls == 1:
+                raise RuntimeError("database is locked")
+            return queue.heartbeat(*args)
+
+    heartbeat = distributed._Heartbeat(Flaky(), job_id, unit_id, "w", 0.3)
+    heartbeat.start()
+    time.sleep(0.5)
+    assert heartbeat.is_alive() and not heartbeat.lost
+    heartbeat.stopped.set()
+    heartbeat.join()
+    assert Flaky.calls >= 2
+    assert queue.complete(job_id, unit_id, "w", [])
+
+
+def test_heartbeat_reports_lost_lease(queue):
+    job_id = submit_job(queue, _companies(1), unit_size=10)
+    unit_id, _ = queue.lease(job_id, "a", 0.05, 3)
+    time.sleep(0.1)
+    assert queue.lease(job_id, "b", 60, 3) is not None
+
+    heartbeat = distributed._Heartbeat(queue, job_id, unit_id, "a", 0.06)
+    heartbeat.start()
+    heartbeat.join(2)
+    assert heartbeat.lost
+
+
+def test_redis_leases_use_server_clock(monkeypatch):
+    queue = _redis_queue()
+    job_id = submit_job(queue, _companies(1), unit_size=10)
+    assert queue.lease(job_id, "a", 60, 3) is not None
+
+    # A worker whose clock runs an hour ahead must not see the lease as expired
+    skewed = types.SimpleNamespace(time=lambda: time.time() + 3600, sleep=time.sleep)
+    monkeypatch.setattr(distributed, "time", skewed)
+    assert queue.lease(job_id, "b", 60, 3) is None
+    assert job_status(queue, job_id)["leased"] == 1
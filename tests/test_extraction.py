@@ -0,0 +1,37 @@
+import host_health
+import extraction
+from extraction import normalize_url, is_failure_result, run_batch
+
+
+def test_normalize_url():
+    assert normalize_url(float("nan")) == ""
+    assert normalize_url(None) == ""
+    assert normalize_url("  acme.example ") == "https://acme.example"
+    assert normalize_url("http://acme.example") == "http://acme.example"
+
+
+def test_is_failure_result():
+    assert is_failure_result([{"RAW_ADDRESS": "Website Unreachable", "SOURCE": "x"}])
+    assert is_failure_result([{"STREET": "Not Found"}])
+    assert is_failure_result([{"STREET": "Error: OpenAI API Key Required"}])
+    assert not is_failure_result([{"STREET": "Not Found"}, {"STREET": "1 Main St"}])
+
+
+def test_run_batch_turns_a_failing_company_into_an_error_row(monkeypatch, tmp_path):
+    def fake_extract(url, *args, **kwargs):
+        if "bad" in url:
+            raise RuntimeError("database is locked")
+        return [{"STREET": "1 Main St", "SOURCE_LINK": url}]
+
+    monkeypatch.setattr(extraction, "extract_company", fake_extract)
+    monkeypatch.setattr(host_health, "preflight", lambda *args, **kwargs: set())
+    breaker = host_health.CircuitBreaker(host_health.HostHealthCache(str(tmp_path / "hosts.db")))
+
+    rows = run_batch([{"COMPANY NAME": "A", "OFFICIAL WEBSITE": "a.example"},
+                      {"COMPANY NAME": "B", "OFFICIAL WEBSITE": "bad.example"},
+                      {"COMPANY NAME": "C", "OFFICIAL WEBSITE": "c.example"},
+                      {"COMPANY NAME": "D", "OFFICIAL WEBSITE": float("nan")}],
+                     concurrency=2, breaker=breaker)
+
+    assert [(r["COMPANY NAME"], r["STREET ADDRESS1"]) for r in rows] == [
+        ("A", "1 Main St"), ("B", "Error: database is locked"), ("C", "1 Main St")]
@@ -0,0 +1,150 @@
+import socket
+import sqlite3
+import threading
+
+import pytest
+
+import host_health
+from host_health import (
+    DEAD_HOST_TTL, HostHealthCache, CircuitBreaker, host_of, preflight, _resolves
+)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HostHealthCache(str(tmp_path / "host_health.db"))
+
+
+class FakeDNS:
+    """socket.getaddrinfo stand-in: errors[host] is raised (or called, then raised)"""
+
+    def __init__(self):
+        self.errors = {}
+        self.calls = []
+
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        self.calls.append(host)
+        error = self.errors.get(host)
+        if callable(error):
+            error = error()
+        if error:
+            raise error
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))]
+
+
+@pytest.fixture
+def fake_dns(monkeypatch):
+    dns = FakeDNS()
+    monkeypatch.setattr(host_health.socket, "getaddrinfo", dns.getaddrinfo)
+    return dns
+
+
+def _expires_at(cache, host):
+    conn = sqlite3.connect(cache.db_path)
+    row = conn.execute("SELECT expires_at, failures FROM dead_hosts WHERE host = ?", (host,)).fetchone()
+    conn.close()
+    return row
+
+
+def test_host_of():
+    assert host_of("Example.COM/about") == "example.com"
+    assert host_of("http://shop.example.com:8080/x") == "shop.example.com"
+    assert host_of("") == ""
+
+
+def test_mark_dead_ttl_escalates_and_is_capped(cache, monkeypatch):
+    monkeypatch.setattr(host_health.time, "time", lambda: 1000.0)
+    ttl = DEAD_HOST_TTL["connect"]
+    for failures in range(1, 7):
+        cache.mark_dead("down.example", "connect")
+        assert _expires_at(cache, "down.example") == (1000.0 + ttl * min(failures, 4), failures)
+
+    # Unknown reasons fall back to the timeout TTL
+    cache.mark_dead("slow.example", "weird")
+    assert _expires_at(cache, "slow.example")[0] == 1000.0 + DEAD_HOST_TTL["timeout"]
+
+
+def test_dead_hosts_expire_and_mark_alive_forgets(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(host_health.time, "time", lambda: now[0])
+    cache.mark_dead("a.example", "timeout")
+    cache.mark_dead("b.example", "dns")
+    assert cache.dead_hosts() == {"a.example", "b.example"}
+    assert cache.dead_hosts(["b.example", "c.example"]) == {"b.example"}
+
+    now[0] += DEAD_HOST_TTL["timeout"] + 1
+    assert cache.dead_hosts() == {"b.example"}
+
+    cache.mark_alive("b.example")
+    assert cache.dead_hosts() == set()
+
+
+def test_breaker_threshold_and_recovery(cache):
+    breaker = CircuitBreaker(cache, threshold=2)
+    url = "https://flaky.example/contact"
+
+    breaker.record_failure(url, "timeout")
+    assert not breaker.is_open(url)
+    assert cache.dead_hosts() == set()
+
+    breaker.record_success(url)
+    breaker.record_failure(url, "timeout")
+    assert not breaker.is_open(url)
+
+    breaker.record_failure(url, "timeout")
+    assert breaker.is_open("http://flaky.example/")
+    assert breaker.open_hosts == {"flaky.example": "timeout"}
+    assert cache.dead_hosts() == {"flaky.example"}
+
+
+def test_trip_opens_without_persisting(cache):
+    breaker = CircuitBreaker(cache)
+    breaker.trip("gone.example")
+    assert breaker.is_open("https://gone.example/about")
+    assert cache.dead_hosts() == set()
+
+
+@pytest.mark.parametrize("error, alive", [
+    (None, True),
+    (socket.gaierror(socket.EAI_NONAME, "Name or service not known"), False),
+    (socket.gaierror(getattr(socket, "EAI_NODATA", socket.EAI_NONAME), "No address"), False),
+    (socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution"), True),
+    (socket.gaierror(socket.EAI_FAIL, "Non-recoverable failure"), True),
+    (UnicodeError("label too long"), False),
+    (OSError("resolver unavailable"), True),
+])
+def test_resolves_classifies_errors(fake_dns, error, alive):
+    fake_dns.errors["host.example"] = error
+    assert _resolves("host.example") is alive
+
+
+def test_preflight_skips_cached_and_blacklists_nxdomain(cache, fake_dns):
+    cache.mark_dead("cached.example", "connect")
+    fake_dns.errors["nx.example"] = socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+    fake_dns.errors["again.example"] = socket.gaierror(socket.EAI_AGAIN, "Temporary failure")
+    breaker = CircuitBreaker(cache)
+
+    dead = preflight(["https://cached.example", "https://nx.example/a", "https://again.example",
+                      "https://ok.example", ""], cache=cache, breaker=breaker)
+
+    assert dead == {"cached.example", "nx.example"}
+    assert "cached.example" not in fake_dns.calls
+    assert cache.dead_hosts() == {"cached.example", "nx.example"}
+    assert _expires_at(cache, "nx.example") is not None
+    assert breaker.open_hosts == {"cached.example": "dns", "nx.example": "dns"}
+
+
+def test_preflight_timeout_assumes_pending_hosts_alive(cache, fake_dns):
+    release = threading.Event()
+
+    def hang():
+        release.wait(5)
+        return socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+    fake_dns.errors["slow.example"] = hang
+    try:
+        dead = preflight(["https://slow.example", "https://ok.example"], cache=cache, timeout=0.2)
+    finally:
+        release.set()
+    assert dead == set()
+    assert cache.dead_hosts() == set()
@@ -0,0 +1,49 @@
+import threading
+
+import metrics
+from metrics import RunMetrics, percentile
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(1, 101)), 95) == 95
+
+
+def test_bounded_collector_keeps_running_totals():
+    run = RunMetrics(max_samples=5)
+    for _ in range(50):
+        with run.span("fetch"):
+            pass
+    assert len(run.spans["fetch"]) == 5
+    assert run.summary()["fetch"]["count"] == 50
+    assert "addressintel_stage_seconds_count{stage=\"fetch\"} 50" in run.to_prometheus()
+
+
+def test_span_counts_stage_errors_once():
+    run = RunMetrics()
+    try:
+        with run.span("fetch"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert run.counters == {"errors.fetch": 1}
+    assert run.summary()["fetch"]["count"] == 1
+
+
+def test_collect_is_per_context():
+    run = RunMetrics()
+    seen = []
+
+    def other_thread():
+        seen.append(metrics.current())
+
+    with metrics.collect(run):
+        metrics.incr("companies")
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+    metrics.incr("companies")
+
+    assert run.counters == {"companies": 1}
+    assert seen and seen[0] is not run
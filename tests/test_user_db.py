@@ -0,0 +1,82 @@
+import hashlib
+import time
+
+import pytest
+
+import user_db
+from user_db import UserDatabase, ConnectionPool, PoolExhaustedError
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Cheapest scrypt cost so the tests stay fast
+    monkeypatch.setattr(UserDatabase, "_calibrate_scrypt_n", staticmethod(lambda: user_db.SCRYPT_MIN_N))
+    return UserDatabase(str(tmp_path / "users.db"), usage_flush_seconds=0.2)
+
+
+def _stored_hash(db, username):
+    with db.pool.connection() as conn:
+        return conn.execute("SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()[0]
+
+
+def test_legacy_sha256_hash_is_upgraded_on_login(db):
+    legacy = hashlib.sha256(b"hunter2").hexdigest()
+    with db.pool.connection() as conn:
+        conn.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", ("alice", legacy))
+
+    assert not db.verify_user("alice", "wrong")["success"]
+    assert _stored_hash(db, "alice") == legacy
+
+    assert db.verify_user("alice", "hunter2")["success"]
+    upgraded = _stored_hash(db, "alice")
+    assert upgraded.startswith("scrypt$")
+    assert db.check_password("hunter2", upgraded) == (True, False)
+
+    # Still logs in with the new hash, and isn't rewritten again
+    assert db.verify_user("alice", "hunter2")["success"]
+    assert _stored_hash(db, "alice") == upgraded
+
+
+def test_usage_is_flushed_by_timer(db):
+    db.record_usage("alice", rows_processed=3)
+    with db.pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 0
+
+    deadline = time.monotonic() + 5
+    while db._usage_buffer and time.monotonic() < deadline:
+        time.sleep(0.05)
+    with db.pool.connection() as conn:
+        assert conn.execute("SELECT SUM(rows_processed) FROM usage").fetchone()[0] == 3
+
+
+def test_usage_is_not_written_on_the_request_path_after_idle(db):
+    time.sleep(0.3)  # longer than usage_flush_seconds since the last flush
+    db.record_usage("alice", rows_processed=1)
+    assert len(db._usage_buffer) == 1
+    assert db.get_usage("alice")["rows_processed"] == 1
+
+
+def test_full_batch_is_flushed_synchronously(tmp_path):
+    db = UserDatabase(str(tmp_path / "users.db"), usage_batch_size=3, usage_flush_seconds=60)
+    for _ in range(3):
+        db.record_usage("bob", rows_processed=2)
+    assert db._usage_buffer == []
+    assert db._flush_timer is None
+    with db.pool.connection() as conn:
+        assert conn.execute("SELECT SUM(rows_processed) FROM usage").fetchone()[0] == 6
+
+
+def test_exhausted_pool_raises_clear_error(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=1, busy_timeout_ms=50)
+    with pool.connection():
+        with pytest.raises(PoolExhaustedError):
+            with pool.connection():
+                pass
+
+
+def test_failed_connect_releases_slot(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "missing" / "pool.db"), size=1)
+    with pytest.raises(Exception):
+        with pool.connection():
+            pass
+    assert pool._created == 0
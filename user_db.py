@@ -1,111 +1,341 @@
 import sqlite3
 import hashlib
+import hmac
+import base64
+import queue
 import secrets
-from datetime import datetime
+import threading
+import time
+import atexit
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import os
 
+# scrypt tuning: r/p fixed, N calibrated once per database to hit the target cost
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MIN_N = 2 ** 14
+SCRYPT_MAX_N = 2 ** 17
+SCRYPT_TARGET_SECONDS = 0.1
+
+
+class PoolExhaustedError(RuntimeError):
+    """No pooled connection became free within the busy timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections in WAL mode with a busy timeout"""
+
+    def __init__(self, db_path, size=5, busy_timeout_ms=5000):
+        self.db_path = db_path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success, rolls back on error"""
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    try:
+                        conn = self._connect()
+                    except Exception:
+                        # Give the slot back so a failed connect doesn't shrink the pool
+                        self._created -= 1
+                        raise
+            if conn is None:
+                try:
+                    conn = self._idle.get(timeout=self.busy_timeout_ms / 1000)
+                except queue.Empty:
+                    raise PoolExhaustedError(
+                        f"All {self.size} database connections are busy ({self.db_path})"
+                    ) from None
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
 class UserDatabase:
-    def __init__(self, db_path="users.db"):
+    # Calibrated scrypt N per database path, shared by every instance in the process
+    _scrypt_n_cache = {}
+
+    def __init__(self, db_path="users.db", pool_size=5, usage_batch_size=50, usage_flush_seconds=5.0):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size)
+        self.usage_batch_size = usage_batch_size
+        self.usage_flush_seconds = usage_flush_seconds
+        self._usage_buffer = []
+        self._usage_lock = threading.Lock()
+        self._flush_timer = None
         self.init_database()
-    
+        atexit.register(self.flush_usage)
+
     def init_database(self):
-        """Create the users table if it doesn't exist"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                email TEXT,
-                is_verified INTEGER DEFAULT 0,
-                verification_token TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                account_type TEXT DEFAULT 'quick'
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
-    
+        """Create the users/usage/settings tables and indexes if they don't exist"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    email TEXT,
+                    is_verified INTEGER DEFAULT 0,
+                    verification_token TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    account_type TEXT DEFAULT 'quick'
+                )
+            """)
+            # username lookups use the index behind its UNIQUE constraint
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_verification_token
+                ON users (verification_token)
+                WHERE verification_token IS NOT NULL
+            """)
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT NOT NULL,
+                    rows_processed INTEGER DEFAULT 0,
+                    llm_tokens INTEGER DEFAULT 0,
+                    recorded_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_usage_username_recorded_at
+                ON usage (username, recorded_at)
+            """)
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+
+    # ---------------- PASSWORD HASHING ----------------
+    def _scrypt_n(self):
+        """scrypt cost N, calibrated once and cached (in memory and in settings)"""
+        if self.db_path in self._scrypt_n_cache:
+            return self._scrypt_n_cache[self.db_path]
+
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT value FROM settings WHERE key = 'scrypt_n'").fetchone()
+        if row:
+            n = int(row[0])
+        else:
+            n = self._calibrate_scrypt_n()
+            with self.pool.connection() as conn:
+                conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('scrypt_n', ?)", (str(n),))
+
+        self._scrypt_n_cache[self.db_path] = n
+        return n
+
+    @staticmethod
+    def _calibrate_scrypt_n():
+        """Largest power-of-two N (within bounds) that hashes in ~SCRYPT_TARGET_SECONDS"""
+        n = SCRYPT_MIN_N
+        while n < SCRYPT_MAX_N:
+            start = time.perf_counter()
+            hashlib.scrypt(b"calibration", salt=b"0" * 16, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                           maxmem=256 * n * SCRYPT_R)
+            if (time.perf_counter() - start) * 2 > SCRYPT_TARGET_SECONDS:
+                break
+            n *= 2
+        return n
+
     def hash_password(self, password):
-        """Hash password using SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
-    
+        """Hash password using scrypt (memory-hard) with a random salt"""
+        n = self._scrypt_n()
+        salt = secrets.token_bytes(16)
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                                maxmem=256 * n * SCRYPT_R)
+        return "scrypt${}${}${}${}${}".format(
+            n, SCRYPT_R, SCRYPT_P,
+            base64.b64encode(salt).decode(), base64.b64encode(digest).decode()
+        )
+
+    def check_password(self, password, password_hash):
+        """Return (matches, needs_rehash) for a stored hash"""
+        if password_hash.startswith("scrypt$"):
+            _, n, r, p, salt, digest = password_hash.split("$")
+            n, r, p = int(n), int(r), int(p)
+            candidate = hashlib.scrypt(password.encode(), salt=base64.b64decode(salt),
+                                       n=n, r=r, p=p, maxmem=256 * n * r)
+            matches = hmac.compare_digest(candidate, base64.b64decode(digest))
+            return matches, matches and n < self._scrypt_n()
+
+        # Legacy unsalted SHA-256 hashes are upgraded on the next successful login
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        matches = hmac.compare_digest(legacy, password_hash)
+        return matches, matches
+
     def generate_token(self):
         """Generate a random verification token"""
         return secrets.token_urlsafe(32)
-    
+
+    # ---------------- ACCOUNTS ----------------
     def create_user(self, username, password, email=None, account_type="quick"):
         """Create a new user (Full signup includes email)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             password_hash = self.hash_password(password)
             verification_token = self.generate_token() if account_type == "full" else None
-            
-            cursor.execute("""
-                INSERT INTO users (username, password_hash, email, verification_token, account_type)
-                VALUES (?, ?, ?, ?, ?)
-            """, (username, password_hash, email, verification_token, account_type))
-            
-            conn.commit()
-            conn.close()
-            
+
+            with self.pool.connection() as conn:
+                conn.execute("""
+                    INSERT INTO users (username, password_hash, email, verification_token, account_type)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (username, password_hash, email, verification_token, account_type))
+
             return {"success": True, "token": verification_token}
         except sqlite3.IntegrityError:
             return {"success": False, "error": "Username already exists"}
         except Exception as e:
             return {"success": False, "error": str(e)}
-    
+
     def verify_user(self, username, password):
         """Verify user credentials"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        password_hash = self.hash_password(password)
-        
-        cursor.execute("""
-            SELECT id, username, email, is_verified, account_type 
-            FROM users 
-            WHERE username = ? AND password_hash = ?
-        """, (username, password_hash))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return {
-                "success": True,
-                "user": {
-                    "id": result[0],
-                    "username": result[1],
-                    "email": result[2],
-                    "is_verified": bool(result[3]),
-                    "account_type": result[4]
-                }
+        with self.pool.connection() as conn:
+            result = conn.execute("""
+                SELECT id, username, email, is_verified, account_type, password_hash
+                FROM users
+                WHERE username = ?
+            """, (username,)).fetchone()
+
+        if not result:
+            return {"success": False}
+
+        matches, needs_rehash = self.check_password(password, result[5])
+        if not matches:
+            return {"success": False}
+
+        if needs_rehash:
+            new_hash = self.hash_password(password)
+            with self.pool.connection() as conn:
+                conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_hash, result[0]))
+
+        return {
+            "success": True,
+            "user": {
+                "id": result[0],
+                "username": result[1],
+                "email": result[2],
+                "is_verified": bool(result[3]),
+                "account_type": result[4]
             }
-        return {"success": False}
-    
+        }
+
     def verify_email(self, token):
         """Mark user as verified using token"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE users 
-                SET is_verified = 1 
-                WHERE verification_token = ?
-            """, (token,))
-            
-            conn.commit()
-            success = cursor.rowcount > 0
-            conn.close()
-            
+            with self.pool.connection() as conn:
+                cursor = conn.execute("""
+                    UPDATE users
+                    SET is_verified = 1
+                    WHERE verification_token = ?
+                """, (token,))
+                success = cursor.rowcount > 0
+
             return {"success": success}
         except Exception as e:
             return {"success": False, "error": str(e)}
+
+    # ---------------- USAGE METERING ----------------
+    def record_usage(self, username, rows_processed=0, llm_tokens=0):
+        """
+        Queue a usage record (rows_processed = input rows / companies).
+        Records are written in one batched transaction once `usage_batch_size`
+        are pending, otherwise by a background timer at most
+        `usage_flush_seconds` after the first pending record (UTC timestamps).
+        """
+        with self._usage_lock:
+            self._usage_buffer.append((username, int(rows_processed), int(llm_tokens),
+                                       datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")))
+            due = len(self._usage_buffer) >= self.usage_batch_size
+            if not due and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.usage_flush_seconds, self._timed_flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if due:
+            self.flush_usage()
+
+    def _timed_flush(self):
+        try:
+            self.flush_usage()
+        except Exception:
+            # Records stay buffered; the next record_usage re-arms the timer
+            pass
+
+    def flush_usage(self):
+        """Write all pending usage records in a single transaction"""
+        with self._usage_lock:
+            pending, self._usage_buffer = self._usage_buffer, []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if not pending:
+            return 0
+        try:
+            with self.pool.connection() as conn:
+                conn.executemany("""
+                    INSERT INTO usage (username, rows_processed, llm_tokens, recorded_at)
+                    VALUES (?, ?, ?, ?)
+                """, pending)
+        except Exception:
+            # Keep the records for the next flush rather than losing them
+            with self._usage_lock:
+                self._usage_buffer = pending + self._usage_buffer
+            raise
+        return len(pending)
+
+    def get_usage(self, username, since=None):
+        """Total usage for a user (optionally since a 'YYYY-MM-DD HH:MM:SS' timestamp), pending records included"""
+        query = "SELECT COALESCE(SUM(rows_processed), 0), COALESCE(SUM(llm_tokens), 0) FROM usage WHERE username = ?"
+        params = [username]
+        if since:
+            query += " AND recorded_at >= ?"
+            params.append(since)
+        with self.pool.connection() as conn:
+            rows, tokens = conn.execute(query, params).fetchone()
+
+        with self._usage_lock:
+            for name, r, t, at in self._usage_buffer:
+                if name == username and (not since or at >= since):
+                    rows += r
+                    tokens += t
+        return {"rows_processed": rows, "llm_tokens": tokens}
+
+    def within_quota(self, username, max_rows=None, max_llm_tokens=None, since=None):
+        """True if the user's usage is below the given limits (None = unlimited)"""
+        usage = self.get_usage(username, since)
+        if max_rows is not None and usage["rows_processed"] >= max_rows:
+            return False
+        if max_llm_tokens is not None and usage["llm_tokens"] >= max_llm_tokens:
+            return False
+        return True